@@ -8,51 +8,162 @@ sys.path.insert(1, './src/')
 import config
 from pathlib import Path
 from doit.tools import run_once
-import platform
+from functools import partial
+import shutil
+
+import nbformat
+from nbclient import NotebookClient
+from nbconvert.exporters import HTMLExporter, PythonExporter
+from nbconvert.preprocessors import ClearOutputPreprocessor, ClearMetadataPreprocessor
+
+import load_CRSP_stock
+import load_FF_industry
+import load_vix
+import clean_CRSP_stock
+import calc_reversal_strategy
+import regression_hac
+import additional_analysis
 
 OUTPUT_DIR = Path(config.OUTPUT_DIR)
 DATA_DIR = Path(config.DATA_DIR)
 
-# fmt: off
+## Task actions are Python callables, so doit runs them in-process. Tasks run
+## serially by default; parallel runs should use processes, not threads
+## (`-P thread`): doit captures a Python action's output by swapping the
+## process-wide sys.stdout/sys.stderr, and matplotlib must plot from the
+## main thread.
+DOIT_CONFIG = {
+    "default_tasks": [
+        "config",
+        "pull_CRSP_Stock",
+        "pull_FF_industry",
+        "pull_vix",
+        "clean_CRSP_stock",
+        "replicate_table_1",
+        "replicate_table_2",
+        "additional_analysis",
+        "convert_notebooks_to_scripts",
+        "run_notebooks",
+        "compile_latex_docs",
+    ],
+}
+
 ## Helper functions for automatic execution of Jupyter notebooks
-def jupyter_execute_notebook(notebook):
-    return f"jupyter nbconvert --execute --to notebook --ClearMetadataPreprocessor.enabled=True --inplace ./src/{notebook}.ipynb"
-def jupyter_to_html(notebook, output_dir=OUTPUT_DIR):
-    return f"jupyter nbconvert --to html --output-dir={output_dir} ./src/{notebook}.ipynb"
+## Each helper is one step applied to an in-memory notebook. A task chains its
+## steps with a `(notebook_pipeline, [notebook, steps])` action, which doit
+## calls directly: the notebook is read once per task and nbconvert and
+## nbclient are imported once per doit run, with no shell.
+def _read_notebook(notebook):
+    return nbformat.read(Path("./src") / f"{notebook}.ipynb", as_version=4)
+def _write_notebook(nb, notebook):
+    nbformat.write(nb, Path("./src") / f"{notebook}.ipynb")
+
+def jupyter_execute_notebook(nb, notebook):
+    """Execute a notebook and save it in place, with its metadata cleared"""
+    # no cell timings are recorded, and the kernel info set during the run is
+    # cleared after executing, so every notebook task writes the same file
+    # for the same outputs
+    NotebookClient(
+        nb, kernel_name="python3", record_timing=False, resources={"metadata": {"path": "./src"}}
+    ).execute()
+    ClearMetadataPreprocessor().preprocess(nb, {})
+    _write_notebook(nb, notebook)
+
+def jupyter_to_html(nb, notebook, output_dir=OUTPUT_DIR):
+    """Convert a notebook to html"""
+    body, _ = HTMLExporter().from_notebook_node(nb, resources={"metadata": {"name": notebook}})
+    (Path(output_dir) / f"{notebook}.html").write_text(body, encoding="utf-8")
+
+# fmt: off
 def jupyter_to_md(notebook, output_dir=OUTPUT_DIR):
     """Requires jupytext"""
     return f"jupytext --to markdown --output-dir={output_dir} ./src/{notebook}.ipynb"
-def jupyter_to_python(notebook, build_dir):
-    """Convert a notebook to a python script"""
-    return f"jupyter nbconvert --to python ./src/{notebook}.ipynb --output _{notebook}.py --output-dir {build_dir}"
-def jupyter_clear_output(notebook):
-    return f"jupyter nbconvert --ClearOutputPreprocessor.enabled=True --ClearMetadataPreprocessor.enabled=True --inplace ./src/{notebook}.ipynb"
 # fmt: on
 
+def jupyter_to_python(nb, notebook, build_dir=OUTPUT_DIR):
+    """Convert a notebook to a python script"""
+    body, _ = PythonExporter().from_notebook_node(nb)
+    (Path(build_dir) / f"_{notebook}.py").write_text(body, encoding="utf-8")
+
+def jupyter_clear_output(nb, notebook):
+    """Clear the outputs and metadata of a notebook"""
+    ClearOutputPreprocessor().preprocess(nb, {})
+    ClearMetadataPreprocessor().preprocess(nb, {})
+
+def copy_notebook_to_folder(nb, notebook, destination_folder):
+    """Copy the saved notebook file to `destination_folder` as `_{notebook}.ipynb`"""
+    shutil.copyfile(Path("./src") / f"{notebook}.ipynb", Path(destination_folder) / f"_{notebook}.ipynb")
+
+def notebook_pipeline(notebook, steps):
+    """Read a notebook once, apply `steps` to it in order and write it back.
+    Each step is called as `step(nb, notebook)`
+    """
+    nb = _read_notebook(notebook)
+    for step in steps:
+        step(nb, notebook)
+    _write_notebook(nb, notebook)
+
+
+## Data files read by the notebooks
+NOTEBOOK_DATA_DEP = [
+    DATA_DIR / "pulled" / file for file in 
+    [
+        "CRSP_stock.parquet",
+        "CRSP_DSIX.parquet",
+        "FF_portfolios_value_weighted.parquet",
+        "FF_portfolios_equal_weighted.parquet",
+        "vix.parquet",
+        "CRSP_closing_price.parquet",
+        "CRSP_midpoint.parquet",
+    ]
+] + [
+    DATA_DIR / "derived" / file for file in 
+    [
+        "reversal_return_2010.parquet",
+        "reversal_return_2023.parquet",
+        "reversal_return_hedged_2010.parquet",
+        "reversal_return_hedged_2023.parquet",
+    ]
+]
+
+## Modules imported by the notebooks
+NOTEBOOK_SRC_DEP = [
+    Path("./src") / file for file in
+    [
+        "config.py",
+        "load_CRSP_stock.py",
+        "load_FF_industry.py",
+        "load_vix.py",
+        "clean_CRSP_stock.py",
+        "calc_reversal_strategy.py",
+        "additional_analysis.py",
+        "regression_hac.py",
+    ]
+]
+
 
-def get_os():
-    os_name = platform.system()
-    if os_name == "Windows":
-        return "windows"
-    elif os_name == "Darwin":
-        return "nix"
-    elif os_name == "Linux":
-        return "nix"
-    else:
-        return "unknown"
-    
-os_type = get_os()
+def task_config():
+    """
+    Create the data and output directories
+    """
+    targets = [DATA_DIR / "pulled", DATA_DIR / "derived", OUTPUT_DIR]
 
+    return {
+        "actions": [config.create_dirs],
+        "targets": targets,
+        "file_dep": ["./src/config.py"],
+        "clean": [],
+    }
 
-def copy_notebook_to_folder(notebook_stem, origin_folder, destination_folder):
-    origin_path = Path(origin_folder) / f"{notebook_stem}.ipynb"
-    destination_path = Path(destination_folder) / f"_{notebook_stem}.ipynb"
-    if os_type == "nix":
-        command =  f"cp {origin_path} {destination_path}"
-    else:
-        command = f"copy  {origin_path} {destination_path}"
-    return command
 
+## The three pull tasks only depend on `task_config`, so they can run
+## concurrently in separate processes (`doit -n 4 -P process`). Run
+## `doit pull_CRSP_Stock` on its own first if WRDS is going to ask for
+## credentials, since worker processes can't read the prompt from stdin.
+## Every other task declares the files
+## it reads in `file_dep`; doit uses those to derive the task ordering,
+## which leaves `task_replicate_table_2` and `task_additional_analysis`
+## free to run in parallel once Table 1 has been replicated.
 
 def task_pull_CRSP_Stock():
     """
@@ -67,16 +178,15 @@ def task_pull_CRSP_Stock():
         [
             ## src/load_CRSP_stock.py
             "CRSP_stock.parquet", 
+            "CRSP_DSIX.parquet",
         ]
     ]
 
     return {
-        "actions": [
-            "ipython src/config.py",
-            "ipython src/load_CRSP_stock.py",
-        ],
+        "actions": [load_CRSP_stock.main],
         "targets": targets,
         "file_dep": file_dep,
+        "task_dep": ["config"],
         "clean": True,
         "verbosity": 2, # Print everything immediately. This is important in
         # case WRDS asks for credentials.
@@ -94,12 +204,10 @@ def task_pull_FF_industry():
     targets = [DATA_DIR / "pulled" / file for file in file_output]
 
     return {
-        "actions": [
-            "ipython src/config.py",
-            "ipython ./src/load_FF_industry.py",
-        ],
+        "actions": [load_FF_industry.main],
         "targets": targets,
         "file_dep": file_dep,
+        "task_dep": ["config"],
         "clean": True,
     }
 
@@ -113,12 +221,10 @@ def task_pull_vix():
     targets = [DATA_DIR / "pulled" / file for file in file_output]
 
     return {
-        "actions": [
-            "ipython src/config.py",
-            "ipython ./src/load_vix.py",
-        ],
+        "actions": [load_vix.main],
         "targets": targets,
         "file_dep": file_dep,
+        "task_dep": ["config"],
         "clean": True,
     }
 
@@ -127,15 +233,16 @@ def task_clean_CRSP_stock():
     """
     Clean CRSP data and save to disk
     """
-    file_dep = ["./src/config.py", "./src/clean_CRSP_stock.py"]
+    file_dep = [
+        "./src/config.py", 
+        "./src/clean_CRSP_stock.py",
+        DATA_DIR / "pulled" / "CRSP_stock.parquet",
+    ]
     file_output = ["CRSP_closing_price.parquet", "CRSP_midpoint.parquet"]
     targets = [DATA_DIR / "pulled" / file for file in file_output]
 
     return {
-        "actions": [
-            "ipython src/config.py",
-            "ipython ./src/clean_CRSP_stock.py",
-        ],
+        "actions": [clean_CRSP_stock.main],
         "targets": targets,
         "file_dep": file_dep,
         "clean": True,
@@ -147,17 +254,23 @@ def task_replicate_table_1():
     Construct reversal strategy,
     replicate Table 1: Summary Statistics of Reversal Strategy Returns
     """
-    file_dep = ["./src/config.py", "./src/calc_reversal_strategy.py"]
+    file_dep = [
+        "./src/config.py", 
+        "./src/calc_reversal_strategy.py",
+        DATA_DIR / "pulled" / "FF_portfolios_value_weighted.parquet",
+        DATA_DIR / "pulled" / "CRSP_closing_price.parquet",
+        DATA_DIR / "pulled" / "CRSP_midpoint.parquet",
+        DATA_DIR / "pulled" / "CRSP_DSIX.parquet",
+    ]
     file_output = ["reversal_return_2010.parquet", "reversal_return_2023.parquet", 
+                   "reversal_return_hedged_2010.parquet", "reversal_return_hedged_2023.parquet", 
                    "Table_1A.parquet", "Table_1B.parquet", 
-                   "Table_1A.parquet_reproduce", "Table_1B_reproduce.parquet"]
+                   "Table_1A_reproduce.parquet", "Table_1B_reproduce.parquet"]
     targets = [DATA_DIR / "derived" / file for file in file_output]
+    targets += [OUTPUT_DIR / "Table_1.tex", OUTPUT_DIR / "Table_1_reproduce.tex"]
 
     return {
-        "actions": [
-            "ipython src/config.py",
-            "ipython ./src/calc_reversal_strategy.py",
-        ],
+        "actions": [calc_reversal_strategy.main],
         "targets": targets,
         "file_dep": file_dep,
         "clean": True,
@@ -167,14 +280,23 @@ def task_replicate_table_2():
     """ 
     Replicate Table 2: Predicting Reversal Strategy Returns with VIX
     """
-    file_dep = ["./src/config.py", "./src/regression_hac.py"]
-    targets = [DATA_DIR / "derived/Table_2.parquet", OUTPUT_DIR / "Table_2.tex"]
+    file_dep = [
+        "./src/config.py", 
+        "./src/regression_hac.py",
+        DATA_DIR / "derived" / "reversal_return_2010.parquet",
+        DATA_DIR / "derived" / "reversal_return_2023.parquet",
+        DATA_DIR / "pulled" / "vix.parquet",
+        DATA_DIR / "pulled" / "CRSP_DSIX.parquet",
+    ]
+    targets = [
+        DATA_DIR / "derived" / "Table_2.parquet", 
+        DATA_DIR / "derived" / "Table_2_reproduce.parquet", 
+        OUTPUT_DIR / "Table_2.tex",
+        OUTPUT_DIR / "Table_2_reproduce.tex",
+    ]
 
     return {
-        "actions": [
-            "ipython src/config.py",
-            "ipython ./src/regression_hac.py",
-        ],
+        "actions": [regression_hac.main],
         "targets": targets,
         "file_dep": file_dep,
         "clean": True,
@@ -184,15 +306,18 @@ def task_additional_analysis():
     """ 
     Generate additional analysis table and figure
     """
-    file_dep = ["./src/config.py", "./src/additional_analysis.py"]
-    file_output = ["Additional_Table.tex", "reversal_strategy_and_vix.png"]
+    file_dep = [
+        "./src/config.py", 
+        "./src/additional_analysis.py",
+        DATA_DIR / "derived" / "reversal_return_2010.parquet",
+        DATA_DIR / "pulled" / "vix.parquet",
+        DATA_DIR / "pulled" / "CRSP_DSIX.parquet",
+    ]
+    file_output = ["Additional_Table.tex", "reversal_strategy_vix.png"]
     targets = [OUTPUT_DIR / file for file in file_output]
 
     return {
-        "actions": [
-            "ipython src/config.py",
-            "ipython ./src/additional_analysis.py",
-        ],
+        "actions": [additional_analysis.main],
         "targets": targets,
         "file_dep": file_dep,
         "clean": True,
@@ -215,10 +340,13 @@ def task_convert_notebooks_to_scripts():
     targets = [build_dir / f"_{stem}.py" for stem in stems]
 
     actions = [
-        # *[jupyter_execute_notebook(notebook) for notebook in notebooks_to_run],
-        # *[jupyter_to_html(notebook) for notebook in notebooks_to_run],
-        *[jupyter_clear_output(notebook) for notebook in stems],
-        *[jupyter_to_python(notebook, build_dir) for notebook in stems],
+        (notebook_pipeline, [notebook, [
+            # jupyter_execute_notebook,
+            # jupyter_to_html,
+            jupyter_clear_output,
+            partial(jupyter_to_python, build_dir=build_dir),
+        ]])
+        for notebook in stems
     ]
     return {
         "actions": actions,
@@ -241,20 +369,32 @@ def task_run_notebooks():
     file_dep = [
         # 'load_other_data.py',
         *[Path(OUTPUT_DIR) / f"_{stem}.py" for stem in stems],
+        ## The notebooks read the pulled and derived data through these
+        ## modules, so a change to either must re-run them
+        *NOTEBOOK_DATA_DEP,
+        *NOTEBOOK_SRC_DEP,
     ]
 
     targets = [
         ## Notebooks converted to HTML
         *[OUTPUT_DIR / f"{stem}.html" for stem in stems],
+        ## Feather copy of the CRSP daily file written by
+        ## `load_CRSP_daily_file(cache=True)` in the notebook
+        DATA_DIR / "cache" / "CRSP_stock.feather",
     ]
 
     actions = [
-        *[jupyter_execute_notebook(notebook) for notebook in stems],
-        *[jupyter_to_html(notebook) for notebook in stems],
-        *[copy_notebook_to_folder(notebook, Path("./src"), OUTPUT_DIR) for notebook in stems],
-        *[copy_notebook_to_folder(notebook, Path("./src"), "./docs") for notebook in stems],
-        *[jupyter_clear_output(notebook) for notebook in stems],
-        # *[jupyter_to_python(notebook, build_dir) for notebook in notebooks_to_run],
+        *[
+            (notebook_pipeline, [notebook, [
+                jupyter_execute_notebook,
+                jupyter_to_html,
+                partial(copy_notebook_to_folder, destination_folder=OUTPUT_DIR),
+                partial(copy_notebook_to_folder, destination_folder="./docs"),
+                jupyter_clear_output,
+                # partial(jupyter_to_python, build_dir=build_dir),
+            ]])
+            for notebook in stems
+        ],
     ]
     return {
         "actions": actions,
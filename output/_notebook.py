@@ -19,8 +19,6 @@ import numpy as np
 import matplotlib.pyplot as plt
 
 import config
-import statsmodels.api as sm
-import plotly.express as px
 
 import load_CRSP_stock
 import load_FF_industry
@@ -29,14 +27,10 @@ import load_vix
 import clean_CRSP_stock
 import calc_reversal_strategy
 import additional_analysis
-import regression
 import regression_hac
 
 DATA_DIR = config.DATA_DIR
 
-import warnings
-warnings.filterwarnings('ignore')
-
 
 # ## Data Collection
 
@@ -55,7 +49,7 @@ warnings.filterwarnings('ignore')
 # In[ ]:
 
 
-df_dsf = load_CRSP_stock.load_CRSP_daily_file(data_dir=DATA_DIR)
+df_dsf = load_CRSP_stock.load_CRSP_daily_file(data_dir=DATA_DIR, cache=True)
 df_dsf.info()
 
 
@@ -177,12 +171,15 @@ def select_stocks_by_quote_midpoints(df):
     df = clean_CRSP_stock.clean_prc_to_positive(df)
 
     # Nasdaq stocks only
-    df = df[df['exchcd'] == 3]
+    df = df.loc[df['exchcd'] == 3].copy()
 
     # adjusting the price using adjustment factors
-    df['bid'] = df['bid'] / df['cfacpr']
-    df['ask'] = df['ask'] / df['cfacpr']
-    df['quote_midpoint'] = (df['bid'] + df['ask']) / 2
+    cfacpr = df['cfacpr'].to_numpy()
+    bid = df['bid'].to_numpy() / cfacpr
+    ask = df['ask'].to_numpy() / cfacpr
+    df['bid'] = bid
+    df['ask'] = ask
+    df['quote_midpoint'] = (bid + ask) / 2
 
     # ratio of bid to quote-midpoint is not smaller than 0.5
     df = clean_CRSP_stock.clean_bid_quote_midpoint(df)
@@ -244,6 +241,8 @@ def calc_reverse_strategy_ret(df, type_col='industry', ret_col='ret'):
 
 
 # To be specific, the returns of the reversal strategies are calculated as an overlay of the returns of five sub-strategies: One with portfolio weights conditioned on day t − 1 returns, one conditioned on day t − 2 data, ..., one conditioned on t − 5 data. Then we calculated the simple average of these five sub-strategies’ returns as the overall reversal strategy return.
+# 
+# The pipeline computes the same returns with `calc_reversal_strategy.calc_reverse_strategy_ret`, which avoids the per-group Python calls of the version above and runs much faster on the daily stock data.
 
 # ### 2. Hedge against market factor risk
 
@@ -264,13 +263,14 @@ def calc_hedged_return(ret):
     
     index = load_CRSP_stock.load_CRSP_index_files(data_dir=DATA_DIR)
     index = index.set_index('caldt')['vwretx']*100
-    shifted_sign = index.shift(1).apply(lambda x: 1 if x > 0 else -1)
+    shifted_sign = np.where(index.shift(1).to_numpy() > 0, np.int8(1), np.int8(-1))
+    shifted_sign = pd.Series(shifted_sign, index=index.index, name=index.name)
     index_shifted_sign = index * shifted_sign
 
     factor = pd.concat([index, index_shifted_sign], axis=1)
 
     beta = calc_reversal_strategy.calc_multiple_beta(factor, ret)
-    time_varying_beta = beta[0] + beta[1] * shifted_sign
+    time_varying_beta = beta.iloc[0] + beta.iloc[1] * shifted_sign
 
     hedged_ret = ret - time_varying_beta * index
 
@@ -537,7 +537,8 @@ ret_raw = calc_reversal_strategy.load_reversal_return(data_dir=DATA_DIR)
 index = pd.read_parquet(DATA_DIR / "pulled" / "CRSP_DSIX.parquet")
 index = index.set_index('caldt')['vwretx']*100
 
-strategies = pd.concat([ret_raw, index], axis=1)
+# the drawdowns and the moving average below need the dates in order
+strategies = pd.concat([ret_raw, index], axis=1).sort_index()
 strategies.columns = ['Transact. prices','Quote-midpoints','Industry portfolio', 'CRSP Value Weighted Index']
 
 
@@ -560,7 +561,7 @@ performance_matrix
 
 
 vix = load_vix.load_vix(data_dir=DATA_DIR)
-reversal_strategy = ret_raw.join(vix, how='left')
+reversal_strategy = ret_raw.join(vix, how='left').sort_index()
 reversal_strategy['Transact. prices'] = reversal_strategy['Transact. prices'].rolling(window=62).mean()
 
 
@@ -568,14 +569,17 @@ reversal_strategy['Transact. prices'] = reversal_strategy['Transact. prices'].ro
 
 
 # Plot reversal strategy and VIX
+# the 3-month average is smooth, so one point per week is enough for the plot
+plot_df = reversal_strategy.resample('W').last()
+
 fig, ax1 = plt.subplots(figsize=(10, 6))
 
-ax1.plot(reversal_strategy.index, reversal_strategy['Transact. prices'], color='brown')
+ax1.plot(plot_df.index, plot_df['Transact. prices'], color='brown')
 ax1.set_ylabel('Average return per day')
 plt.legend(['Average return per day'])
 
 ax2 = ax1.twinx()
-ax2.plot(reversal_strategy.index, reversal_strategy['VIXCLS'])
+ax2.plot(plot_df.index, plot_df['VIXCLS'])
 ax2.set_ylabel('VIX')
 plt.legend(['VIX'])
 
@@ -6,14 +6,11 @@ It also generates a plot of the reversal strategy vs. the VIX index.
 
 import pandas as pd
 import numpy as np
-import pandas_datareader
 import statsmodels.api as sm
 import config
 from pathlib import Path
 import matplotlib.pyplot as plt
 
-import warnings
-warnings.filterwarnings("ignore")
 
 DATA_DIR = Path(config.DATA_DIR)
 START_DATE = config.START_DATE
@@ -38,24 +35,45 @@ def performance_summary(return_data, annualization = 252):
 
     summary_stats['Skewness'] = return_data.skew()
     summary_stats['Kurtosis'] = return_data.kurtosis() + 3
-    summary_stats['VaR (0.05)(%)'] = return_data.quantile(.05, axis = 0)
-    summary_stats['CVaR (0.05)(%)'] = return_data[return_data <= return_data.quantile(.05, axis = 0)].mean()
+    # the quantile partitions every column, so compute it once for VaR and CVaR
+    var = return_data.quantile(.05, axis = 0)
+    summary_stats['VaR (0.05)(%)'] = var
+    summary_stats['CVaR (0.05)(%)'] = return_data[return_data <= var].mean()
     
-    wealth_index = (1+return_data/100).cumprod()
-    previous_peaks = wealth_index.cummax()
-    drawdowns = (wealth_index - previous_peaks)/previous_peaks
-
-    summary_stats['Max Drawdown(%)'] = drawdowns.min() * 100
-    summary_stats = summary_stats.applymap('{:.2f}'.format)
-    summary_stats['Peak'] = [previous_peaks[col][:drawdowns[col].idxmin()].idxmax() for col in previous_peaks.columns]
-    summary_stats['Bottom'] = drawdowns.idxmin()
-    
-    recovery_date = []
-    for col in wealth_index.columns:
-        prev_max = previous_peaks[col][:drawdowns[col].idxmin()].max()
-        recovery_wealth = pd.DataFrame([wealth_index[col][drawdowns[col].idxmin():]]).T
-        recovery_date.append(recovery_wealth[recovery_wealth[col] >= prev_max].index.min())
-    summary_stats['Recovery Date'] = recovery_date
+    # wealth index, running peaks and drawdowns on the underlying array, with
+    # missing returns skipped and left missing like pandas' cumprod/cummax.
+    # Kept in float64 (the table reports 2 decimals of 25-year products), and
+    # computed in place on one owned copy of the returns
+    wealth = return_data.to_numpy(dtype=float, copy=True)
+    missing = np.isnan(wealth)
+    wealth /= 100
+    wealth += 1
+    wealth = np.nancumprod(wealth, axis=0, out=wealth)
+    wealth[missing] = np.nan
+    peaks = np.fmax.accumulate(wealth, axis=0)
+    peaks[missing] = np.nan
+    drawdowns = wealth - peaks
+    drawdowns /= peaks
+
+    summary_stats['Max Drawdown(%)'] = np.nanmin(drawdowns, axis=0) * 100
+    summary_stats = pd.DataFrame(np.char.mod('%.2f', summary_stats.to_numpy(dtype=float)),
+                                 index=summary_stats.index, columns=summary_stats.columns)
+
+    # locate the peak, bottom and recovery of the max drawdown of every column
+    # at once (NaN compares False, as pandas skips it)
+    dates = return_data.index
+    cols = np.arange(wealth.shape[1])
+    bottom = np.nanargmin(drawdowns, axis=0)
+    prev_max = peaks[bottom, cols]
+    # first day the running peak reached its level at the bottom
+    peak = (peaks >= prev_max).argmax(axis=0)
+    # first day from the bottom on when the wealth is back to that peak
+    recovered = (wealth >= prev_max) & (np.arange(len(dates))[:, None] >= bottom)
+    recovery = pd.DatetimeIndex(dates[recovered.argmax(axis=0)]).where(recovered.any(axis=0))
+
+    summary_stats['Peak'] = dates[peak]
+    summary_stats['Bottom'] = dates[bottom]
+    summary_stats['Recovery Date'] = recovery
 
     summary_stats["Duration (days)"] = [
         (i - j).days if i != "-" else "-"
@@ -70,34 +88,46 @@ def performance_summary(return_data, annualization = 252):
     return summary_stats.T
 
 
-if __name__ == "__main__":
-
+def main():
+    """
+    Generate the additional analysis table and the reversal strategy vs. VIX figure
+    """
     # Generate Additional Analysis Table
     ret_raw = calc_reversal_strategy.load_reversal_return(data_dir=DATA_DIR)
-    index = pd.read_parquet(DATA_DIR / "pulled" / "CRSP_DSIX.parquet")
+    # only the date and the value-weighted return of the index are used
+    index = pd.read_parquet(DATA_DIR / "pulled" / "CRSP_DSIX.parquet",
+                            columns=['caldt', 'vwretx'], memory_map=True)
     index = index.set_index('caldt')['vwretx']*100
-    strategies = pd.concat([ret_raw, index], axis=1)
+    # the drawdowns and the moving average below need the dates in order
+    strategies = pd.concat([ret_raw, index], axis=1).sort_index()
     strategies.columns = ['Transact. prices','Quote-midpoints','Industry portfolio', 'CRSP Value Weighted Index']
     performance_matrix = performance_summary(strategies, 252)
     performance_matrix.to_latex(OUTPUT_DIR / 'Additional_Table.tex', escape=True)
     # performance_matrix.to_parquet(DATA_DIR / "derived" / "Additional_Table.parquet")
 
     vix = load_vix.load_vix(data_dir=DATA_DIR)
-    reversal_strategy = ret_raw.join(vix, how='left')
+    reversal_strategy = ret_raw.join(vix, how='left').sort_index()
     reversal_strategy['Transact. prices'] = reversal_strategy['Transact. prices'].rolling(window=62).mean()
 
     # Plot reversal strategy and VIX
+    # the 3-month average is smooth, so one point per week is enough for the plot
+    plot_df = reversal_strategy.resample('W').last()
+
     fig, ax1 = plt.subplots(figsize=(10, 6))
 
-    ax1.plot(reversal_strategy.index, reversal_strategy['Transact. prices'], color='brown')
+    ax1.plot(plot_df.index, plot_df['Transact. prices'], color='brown')
     ax1.set_ylabel('Average return per day')
     plt.legend(['Average return per day'])
 
     ax2 = ax1.twinx()
-    ax2.plot(reversal_strategy.index, reversal_strategy['VIXCLS'])
+    ax2.plot(plot_df.index, plot_df['VIXCLS'])
     ax2.set_ylabel('VIX')
     plt.legend(['VIX'])
 
     ax1.set_xlabel('Date')
 
-    plt.savefig(OUTPUT_DIR / 'reversal_strategy_vix.png');
\ No newline at end of file
+    plt.savefig(OUTPUT_DIR / 'reversal_strategy_vix.png')
+
+
+if __name__ == "__main__":
+    main()
@@ -6,18 +6,19 @@ The data is needed to replicate and reproduce Table 1 and Table 2 in the paper,
 """
 
 import pandas as pd
-import pandas_datareader
+import numpy as np
 import statsmodels.api as sm
+from statsmodels.tools.tools import pinv_extended
 import config
 from pathlib import Path
 
-import warnings
-warnings.filterwarnings("ignore")
 
 OUTPUT_DIR = Path(config.OUTPUT_DIR)
 DATA_DIR = Path(config.DATA_DIR)
 START_DATE = config.START_DATE
 END_DATE = config.END_DATE
+# the daily return series are read back by every later table; zstd keeps them small
+PARQUET_OPTIONS = {'compression': 'zstd', 'compression_level': 3}
 
 import load_FF_industry
 import load_CRSP_stock
@@ -29,25 +30,51 @@ def calc_reverse_strategy_ret(df, type_col='industry', ret_col='ret'):
     Calculate the reversal strategy return as the average of 
     the past 5 days' reversal strategy returns
     """
-    df['ret-avg'] = df.groupby('date')[ret_col].transform(lambda x: x - x.mean())
-    df['w'] = df.groupby('date')['ret-avg'].transform(lambda x: - x / (0.5 * x.abs().sum()))
-
-    for i in range(1, 6):
-        df[f'w_lag_{i}'] = df.groupby(type_col)['w'].shift(i) 
-
-    df['rev_ret'] = (df['w_lag_1'] + df['w_lag_2'] + df['w_lag_3'] + df['w_lag_4'] + df['w_lag_5']) * df[ret_col] / 5
-
-    return df.groupby('date')['rev_ret'].sum()
+    # hash the date and industry/stock keys once, and group by their integer codes.
+    # The built-in groupby aggregations replace a Python lambda per date, and the
+    # intermediate series are kept local rather than added as columns of df
+    date_codes, dates = pd.factorize(df['date'], sort=True)
+    type_codes = pd.factorize(df[type_col])[0]
+
+    ret_avg = df[ret_col] - df[ret_col].groupby(date_codes).transform('mean')
+    w = - ret_avg / (0.5 * ret_avg.abs().groupby(date_codes).transform('sum'))
+
+    # sum of the weights over the past 5 rows of each industry/stock: shift once,
+    # then sum 5-row windows (lag 1 first, as before) with the rows ordered by
+    # industry/stock. The shifted first row of each one is NaN, so a window
+    # spanning two of them is NaN, as the separate lags were
+    w_lag = w.groupby(type_codes).shift(1).to_numpy()
+    order = np.argsort(type_codes, kind='stable')
+    w_lag = np.concatenate([np.full(4, np.nan), w_lag[order]])
+    lags = np.lib.stride_tricks.sliding_window_view(w_lag, 5)
+    w_lag_sum = np.empty(len(df))
+    w_lag_sum[order] = lags[:, 4] + lags[:, 3] + lags[:, 2] + lags[:, 1] + lags[:, 0]
+
+    rev_ret = pd.Series(w_lag_sum * df[ret_col].to_numpy() / 5, name='rev_ret')
+    rev_ret = rev_ret.groupby(date_codes).sum()
+    rev_ret.index = dates.rename('date')
+    return rev_ret
 
 
 def calc_reverse_strategy_industry(df, start=START_DATE, end=END_DATE):
     """
     Calculate the reversal strategy return for industry portfolios
     """
-    df = df.unstack().reset_index()
-    df.columns = ["industry", "date", "ret"]
-
-    rev_ret = calc_reverse_strategy_ret(df, 'industry', 'ret')
+    # the portfolio returns are already a dense date x industry table, so work on it
+    # directly: the cross-section is a row and the lags of an industry run down a column
+    # rows are made contiguous and the final sum goes through a groupby so every
+    # reduction adds in the same order as the long-form groupby version does
+    ret = np.ascontiguousarray(df.to_numpy(dtype=float))
+    ret_avg = ret - np.nanmean(ret, axis=1, keepdims=True)
+    w = - ret_avg / (0.5 * np.nansum(np.abs(ret_avg), axis=1, keepdims=True))
+
+    w_lag = np.concatenate([np.full((5, w.shape[1]), np.nan), w[:-1]])
+    lags = np.lib.stride_tricks.sliding_window_view(w_lag, 5, axis=0)
+    w_lag_sum = lags[..., 4] + lags[..., 3] + lags[..., 2] + lags[..., 1] + lags[..., 0]
+
+    rev_ret = (pd.Series((w_lag_sum * ret / 5).ravel())
+               .groupby(np.repeat(df.index.rename('date'), ret.shape[1])).sum()
+               .rename('rev_ret'))
     return rev_ret[(rev_ret.index>=start) & (rev_ret.index<=end)]
 
 
@@ -58,12 +85,28 @@ def calc_reverse_strategy_individual(df, ret_col='retx', start=START_DATE, end=E
         - df: dataframe containing individual stock returns
         - ret_col: column name of the return
     """
-    df[ret_col] *= 100
-
-    rev_ret = calc_reverse_strategy_ret(df, 'permno', ret_col)
+    rev_ret = calc_reverse_strategy_ret(df, 'permno', ret_col) * 100
     return rev_ret[(rev_ret.index>=start) & (rev_ret.index<=end)]
 
 
+def ols_params(X, y):
+    """
+    OLS coefficients of y on X, indexed by the columns of X
+
+    Only the coefficients are needed, so apply the pseudo-inverse OLS uses
+    directly instead of building a statsmodels model and results object.
+    Rows with a missing value are dropped, as OLS(missing='drop') does, and
+    rows are matched by position, so X and y must share the same index.
+    """
+    if hasattr(X, 'index') and hasattr(y, 'index') and not X.index.equals(y.index):
+        raise ValueError("The indices for endog and exog are not aligned")
+    X = pd.DataFrame(X)
+    y = np.asarray(y, dtype=float)
+    x = X.to_numpy(dtype=float)
+    keep = ~(np.isnan(y) | np.isnan(x).any(axis=1))
+    return pd.Series(pinv_extended(x[keep])[0] @ y[keep], index=X.columns)
+
+
 def calc_beta(factor, fund_ret, constant = True):
     """
     Calculate beta of fund returns on a factor
@@ -74,13 +117,13 @@ def calc_beta(factor, fund_ret, constant = True):
         X = factor
 
     y = fund_ret
-    model = sm.OLS(y, X, missing='drop').fit()
+    params = ols_params(X, y)
     
     if constant:
-        beta = model.params[1]
+        beta = params.iloc[1]
         
     else:
-        beta = model.params
+        beta = params
 
     return beta
 
@@ -95,34 +138,57 @@ def calc_multiple_beta(factor, fund_ret, constant = True):
         X = factor
 
     y = fund_ret
-    model = sm.OLS(y, X, missing='drop').fit()
+    params = ols_params(X, y)
     
     if constant:
-        beta = model.params[1:]
+        beta = params[1:]
         
     else:
-        beta = model.params
+        beta = params
 
     return beta
 
 
-def calc_hedged_return(ret, reproduce=False):
+def load_index_return(reproduce=False):
     """
-    Calculate returns of hedged reversal strategy
+    Load the CRSP value-weighted index return (%) until the end date of
+    the data used in replication (2010) or reproduction (2023)
     """
     index = load_CRSP_stock.load_CRSP_index_files(data_dir=DATA_DIR)
     if reproduce:
         index = index[index['caldt'] <= '2023-12-31']
     else:
         index = index[index['caldt'] <= '2010-12-31']
-    index = index.set_index('caldt')['vwretx']*100
-    shifted_sign = index.shift(1).apply(lambda x: 1 if x > 0 else -1)
+    return index.set_index('caldt')['vwretx']*100
+
+
+def calc_hedge_factor(reproduce=False):
+    """
+    Build the conditional market factor used to hedge the reversal strategies
+    Returns the index return, the sign of the previous day's index return and
+    the factor frame [index, index * sign], so several strategies can share them
+    """
+    index = load_index_return(reproduce)
+    # sign of the previous day's market return, -1 when it is not positive (or missing)
+    shifted_sign = np.where(index.shift(1).to_numpy() > 0, np.int8(1), np.int8(-1))
+    shifted_sign = pd.Series(shifted_sign, index=index.index, name=index.name)
     index_shifted_sign = index * shifted_sign
 
     factor = pd.concat([index, index_shifted_sign], axis=1)
+    return index, shifted_sign, factor
+
+
+def calc_hedged_return(ret, reproduce=False, hedge_factor=None):
+    """
+    Calculate returns of hedged reversal strategy
+    - hedge_factor: output of calc_hedge_factor(reproduce), built here when not given
+    """
+    if hedge_factor is None:
+        hedge_factor = calc_hedge_factor(reproduce)
+    index, shifted_sign, factor = hedge_factor
 
     beta = calc_multiple_beta(factor, ret)
-    time_varying_beta = beta[0] + beta[1] * shifted_sign
+    time_varying_beta = beta.iloc[0] + beta.iloc[1] * shifted_sign
 
     hedged_ret = ret - time_varying_beta * index
 
@@ -141,16 +207,12 @@ def summary_stats(df, reproduce=False):
     stats['Worst day return(%)'] = df.min()
     stats['Worst 3-month return(%)'] = df.rolling(63).sum().min()
 
-    index = load_CRSP_stock.load_CRSP_index_files(data_dir=DATA_DIR)
-    if reproduce:
-        index = index[index['caldt'] <= '2023-12-31']
-    else:
-        index = index[index['caldt'] <= '2010-12-31']
-    index = index.set_index('caldt')['vwretx']*100
+    index = load_index_return(reproduce)
     stats['Beta'] = df.apply(lambda x: calc_beta(index, x), axis=0)
     stats['Annualized Sharpe Ratio'] = stats['Mean return(% per day)'] / stats['Std.dev.(% per day)'] * (252**0.5)
 
-    stats = stats.applymap('{:.2f}'.format)
+    # keep the table numeric; cells are formatted when the LaTeX is written
+    stats = stats.round(2)
 
     return stats.T
 
@@ -173,7 +235,7 @@ def load_reversal_return(data_dir=DATA_DIR, hedged=False, reproduce=False):
             path = Path(data_dir) / "derived" / "reversal_return_2023.parquet"
         else:
             path = Path(data_dir) / "derived" / "reversal_return_2010.parquet"
-    return pd.read_parquet(path)
+    return load_CRSP_stock.read_parquet_cached(path)
 
 
 def load_Table_1A(data_dir=DATA_DIR, reproduce=False):
@@ -218,10 +280,6 @@ def table_to_latex(reproduce=False):
     df_A.index = expected_index
     df_B.index = expected_index
 
-    import pandas as pd
-    df = pd.DataFrame({"a":range(10), "b":range(10,20)})
-
-
     with open(OUTPUT_DIR / (filename + '.tex'), 'w') as f:
         f.write("\\begin{tabular}{l" + "".join(["c"] * len(df_A.columns)) + "}\n")
         f.write("\\toprule\n")
@@ -232,16 +290,16 @@ def table_to_latex(reproduce=False):
         f.write("\\midrule\n")
 
         # Panel A
-        for idx, row in df_A.iterrows():
-            f.write(idx + " & " + " & ".join([str(x) for x in row.values]) + " \\\\\n")
+        f.write("".join(idx + " & " + " & ".join(f"{x:.2f}" for x in row) + " \\\\\n"
+                        for idx, row in zip(df_A.index, df_A.to_numpy(dtype=float))))
         
         # Panel B
         f.write("\\midrule\n")
         f.write("\\multicolumn{4}{c}{Panel B: Returns hedged for conditional market factor exposure} \\\\\n")
         f.write("\\midrule\n")
 
-        for idx, row in df_B.iterrows():
-            f.write(idx + " & " + " & ".join([str(x) for x in row.values]) + " \\\\\n")
+        f.write("".join(idx + " & " + " & ".join(f"{x:.2f}" for x in row) + " \\\\\n"
+                        for idx, row in zip(df_B.index, df_B.to_numpy(dtype=float))))
 
         f.write("\\bottomrule\n")
         f.write("\\end{tabular}")
@@ -261,10 +319,14 @@ def demo():
     df_1B_new = load_Table_1B(data_dir=DATA_DIR, reproduce=True)
 
 
-if __name__ == "__main__":
+def main():
+    """
+    Construct the reversal strategies and generate Table 1 for replication and reproduction
+    """
     ff = load_FF_industry.load_FF_industry_portfolio_daily(data_dir=DATA_DIR)[0]
-    dfcp = clean_CRSP_stock.load_CRSP_closing_price(data_dir=DATA_DIR)
-    dfmid = clean_CRSP_stock.load_CRSP_midpoint(data_dir=DATA_DIR)
+    # only the columns the strategies use, so the parquet reader skips the rest
+    dfcp = clean_CRSP_stock.load_CRSP_closing_price(data_dir=DATA_DIR, columns=['date', 'permno', 'retx'])
+    dfmid = clean_CRSP_stock.load_CRSP_midpoint(data_dir=DATA_DIR, columns=['date', 'permno', 'quote_midpoint_return'])
 
     ff_2010 = ff[(ff.index >= '1998-01-01') & (ff.index <= '2010-12-31')]
     dfcp_2010 = dfcp[(dfcp['date'] >= '1998-01-01') & (dfcp['date'] <= '2010-12-31')]
@@ -278,7 +340,7 @@ if __name__ == "__main__":
 
     ret_raw = pd.concat([ret_transact, ret_midpoint, ret_industry], axis=1)
     ret_raw.columns = ['Transact. prices', 'Quote-midpoints', 'Industry portfolio']
-    ret_raw.to_parquet(DATA_DIR / "derived" / "reversal_return_2010.parquet")
+    ret_raw.to_parquet(DATA_DIR / "derived" / "reversal_return_2010.parquet", **PARQUET_OPTIONS)
 
     ret_raw = load_reversal_return(data_dir=DATA_DIR)
 
@@ -293,7 +355,7 @@ if __name__ == "__main__":
 
     ret_raw_new = pd.concat([ret_transact_new, ret_midpoint_new, ret_industry_new], axis=1)
     ret_raw_new.columns = ['Transact. prices', 'Quote-midpoints', 'Industry portfolio']
-    ret_raw_new.to_parquet(DATA_DIR / "derived" / "reversal_return_2023.parquet")
+    ret_raw_new.to_parquet(DATA_DIR / "derived" / "reversal_return_2023.parquet", **PARQUET_OPTIONS)
 
     ret_raw_new = load_reversal_return(data_dir=DATA_DIR, reproduce=True)
 
@@ -302,13 +364,14 @@ if __name__ == "__main__":
 
 
     # Replicate Table 1B
-    hedged_ret_transact = calc_hedged_return(ret_transact, reproduce=False)
-    hedged_ret_midpoint = calc_hedged_return(ret_midpoint, reproduce=False)
-    hedged_ret_industry = calc_hedged_return(ret_industry, reproduce=False)
+    hedge_factor = calc_hedge_factor(reproduce=False)
+    hedged_ret_transact = calc_hedged_return(ret_transact, hedge_factor=hedge_factor)
+    hedged_ret_midpoint = calc_hedged_return(ret_midpoint, hedge_factor=hedge_factor)
+    hedged_ret_industry = calc_hedged_return(ret_industry, hedge_factor=hedge_factor)
 
     ret_hedged = pd.concat([hedged_ret_transact, hedged_ret_midpoint, hedged_ret_industry], axis=1)
     ret_hedged.columns = ['Hedged Transact. prices', 'Hedged Quote-midpoints', 'Hedged Industry portfolio']
-    ret_hedged.to_parquet(DATA_DIR / "derived" / "reversal_return_hedged_2010.parquet")
+    ret_hedged.to_parquet(DATA_DIR / "derived" / "reversal_return_hedged_2010.parquet", **PARQUET_OPTIONS)
 
     ret_hedged = load_reversal_return(data_dir=DATA_DIR, hedged=True, reproduce=False)
     
@@ -317,13 +380,14 @@ if __name__ == "__main__":
 
 
     # Reproduce Table 1B
-    hedged_transact_new = calc_hedged_return(ret_transact_new, reproduce=True)
-    hedged_midpoint_new = calc_hedged_return(ret_midpoint_new, reproduce=True)
-    hedged_industry_new = calc_hedged_return(ret_industry_new, reproduce=True)
+    hedge_factor_new = calc_hedge_factor(reproduce=True)
+    hedged_transact_new = calc_hedged_return(ret_transact_new, hedge_factor=hedge_factor_new)
+    hedged_midpoint_new = calc_hedged_return(ret_midpoint_new, hedge_factor=hedge_factor_new)
+    hedged_industry_new = calc_hedged_return(ret_industry_new, hedge_factor=hedge_factor_new)
 
     ret_hedged_new = pd.concat([hedged_transact_new, hedged_midpoint_new, hedged_industry_new], axis=1)
     ret_hedged_new.columns = ['Hedged Transact. prices', 'Hedged Quote-midpoints', 'Hedged Industry portfolio']
-    ret_hedged_new.to_parquet(DATA_DIR / "derived" / "reversal_return_hedged_2023.parquet")
+    ret_hedged_new.to_parquet(DATA_DIR / "derived" / "reversal_return_hedged_2023.parquet", **PARQUET_OPTIONS)
 
     ret_hedged_new = load_reversal_return(data_dir=DATA_DIR, hedged=True, reproduce=True)
     
@@ -333,4 +397,8 @@ if __name__ == "__main__":
 
     # Latex table for Table_1 and Table_1_reproduce
     table_to_latex(reproduce=False)
-    table_to_latex(reproduce=True)
\ No newline at end of file
+    table_to_latex(reproduce=True)
+
+
+if __name__ == "__main__":
+    main()
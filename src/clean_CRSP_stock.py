@@ -5,6 +5,7 @@ The cleaned data is needed to construct the individual portfolios used in Revers
 
 import pandas as pd
 import numpy as np
+import warnings
 import config
 from pathlib import Path
 
@@ -42,7 +43,11 @@ def clean_date(df, start_year=1998, end_year=2024):
     """
     Select the CRSP stock data for a specific time period
     """
-    df['date'] = pd.to_datetime(df['date'])
+    # df is usually a filtered slice of the loaded frame, and only the
+    # returned selection is used afterwards
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', category=pd.errors.SettingWithCopyWarning)
+        df['date'] = pd.to_datetime(df['date'])
     # df = df[(df['date'].dt.year >= start_year) & (df['date'].dt.year <= end_year)]
     # df = df[df['date'] >= '1997-12-27']
     date = df['date'].unique()
@@ -77,16 +82,17 @@ def clean_1dollar_prc(df):
     if the closing price of the stock at last day of previous month is less than 1, 
     then this row will be removed from the dataset.
     """
-    df['period'] = df['date'].dt.to_period('M')
-    df_month = df.copy()
-    df_month = df_month.groupby(['permno', 'period'], as_index=False).last()
-    df_month = df_month[df_month['prc'] < 1]
-    df_month['period'] = df_month['period'] + 1
+    # months as consecutive integers (year * 12 + month), so the next month is period + 1
+    period = df['date'].dt.year.to_numpy() * 12 + df['date'].dt.month.to_numpy()
+    # last closing price of each stock in each month; only prc is needed, so no copy of df
+    last_prc = df['prc'].groupby([df['permno'], period]).last()
+    last_prc = last_prc[last_prc < 1]
+
+    # match on the (permno, following month) pairs directly instead of building string keys
+    below_1dollar = pd.MultiIndex.from_arrays([last_prc.index.get_level_values(0),
+                                               last_prc.index.get_level_values(1) + 1])
+    df = df[~pd.MultiIndex.from_arrays([df['permno'], period]).isin(below_1dollar)]
 
-    df['key'] = df['permno'].astype(str) + df['period'].astype(str)
-    df_month['key'] = df_month['permno'].astype(str) + df_month['period'].astype(str)
-    df = df[~df['key'].isin(df_month['key'])].drop(columns=['key', 'period'])
-    
     return df
 
 
@@ -113,9 +119,11 @@ def clean_one_day_return(df):
     df['prc'] = df['prc'].fillna(0)
     df['quote_midpoint'] = df['quote_midpoint'].abs().fillna(0)
 
-    # calculate the one-day return
-    df['transaction_price_return'] = df.groupby('permno')['prc'].pct_change()
-    df['quote_midpoint_return'] = df.groupby('permno')['quote_midpoint'].pct_change()
+    # calculate the one-day return: both prices are shifted in one groupby on permno,
+    # and with no missing prices left this is the same division pct_change does
+    prev = df.groupby('permno', sort=False)[['prc', 'quote_midpoint']].shift(1)
+    df['transaction_price_return'] = df['prc'] / prev['prc'] - 1
+    df['quote_midpoint_return'] = df['quote_midpoint'] / prev['quote_midpoint'] - 1
 
     df = df[(df['quote_midpoint_return'] - df['transaction_price_return'] >= -0.5) & (df['quote_midpoint_return'] - df['transaction_price_return'] <= 1)]
 
@@ -154,14 +162,18 @@ def select_stocks_by_quote_midpoints(df):
     df = clean_prc_to_positive(df)
 
     # Nasdaq stocks only
-    df = df[df['exchcd'] == 3]
+    # (an owned copy, so the quote adjustments below are not set on a slice)
+    df = df.loc[df['exchcd'] == 3].copy()
 
     # calculate mid-quote
 
     # adjusting the price using adjustment factors
-    df['bid'] = df['bid'] / df['cfacpr']
-    df['ask'] = df['ask'] / df['cfacpr']
-    df['quote_midpoint'] = (df['bid'] + df['ask']) / 2
+    cfacpr = df['cfacpr'].to_numpy()
+    bid = df['bid'].to_numpy() / cfacpr
+    ask = df['ask'].to_numpy() / cfacpr
+    df['bid'] = bid
+    df['ask'] = ask
+    df['quote_midpoint'] = (bid + ask) / 2
 
     # clean the sample: ratio of bid to quote-midpoint is not smaller than 0.5
     df = clean_bid_quote_midpoint(df)
@@ -183,21 +195,23 @@ def select_stocks_by_quote_midpoints(df):
 ### Functions to load the dataset ###
 
 
-def load_CRSP_closing_price(data_dir=DATA_DIR):
+def load_CRSP_closing_price(data_dir=DATA_DIR, columns=None):
     """
     Load cleaned CRSP stock data for strategy based on closing prices
+    - columns: columns to read, all columns if None
     """
     path = Path(data_dir) / "pulled" / "CRSP_closing_price.parquet"
-    df = pd.read_parquet(path)
+    df = pd.read_parquet(path, columns=columns)
     return df
 
 
-def load_CRSP_midpoint(data_dir=DATA_DIR):
+def load_CRSP_midpoint(data_dir=DATA_DIR, columns=None):
     """
     Load cleaned CRSP stock data for strategy based on quote-midpoints
+    - columns: columns to read, all columns if None
     """
     path = Path(data_dir) / "pulled" / "CRSP_midpoint.parquet"
-    df = pd.read_parquet(path)
+    df = pd.read_parquet(path, columns=columns)
     return df
 
 
@@ -207,11 +221,18 @@ def _demo():
     dfmid = load_CRSP_midpoint(data_dir=DATA_DIR)
 
 
-if __name__ == "__main__":
+def main():
+    """
+    Clean the CRSP daily stock data for both strategies and save them to disk
+    """
     df_dsf = load_CRSP_stock.load_CRSP_daily_file(data_dir=DATA_DIR)
 
     df_closing_prices = select_stocks_by_closing_prices(df_dsf)
     df_closing_prices.to_parquet(DATA_DIR / "pulled" / "CRSP_closing_price.parquet")
 
     df_midpoint = select_stocks_by_quote_midpoints(df_dsf)
-    df_midpoint.to_parquet(DATA_DIR / "pulled" / "CRSP_midpoint.parquet")
\ No newline at end of file
+    df_midpoint.to_parquet(DATA_DIR / "pulled" / "CRSP_midpoint.parquet")
+
+
+if __name__ == "__main__":
+    main()
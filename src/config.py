@@ -28,13 +28,19 @@ WRDS_USERNAME = config("WRDS_USERNAME", default="")
 START_DATE = config("START_DATE", default="1998-01-01")
 END_DATE = config("END_DATE", default="2023-12-31")
 
-if __name__ == "__main__":
-    
-    ## If they don't exist, create the data and output directories
+
+def create_dirs():
+    """
+    If they don't exist, create the data and output directories
+    """
     (DATA_DIR / 'pulled').mkdir(parents=True, exist_ok=True)
+    (DATA_DIR / 'derived').mkdir(parents=True, exist_ok=True)
 
     # Sometimes, I'll create other folders to organize the data
     # (DATA_DIR / 'intermediate').mkdir(parents=True, exist_ok=True)
-    # (DATA_DIR / 'derived').mkdir(parents=True, exist_ok=True)
 
     OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+
+
+if __name__ == "__main__":
+    create_dirs()
@@ -4,12 +4,12 @@ The data is needed to construct portfolios used in Reversal strategy.
 """
 
 from datetime import datetime
+from functools import lru_cache
 from dateutil.relativedelta import relativedelta
 from pathlib import Path
 
 import numpy as np
 import pandas as pd
-import wrds
 
 import config
 
@@ -28,6 +28,8 @@ def pull_CRSP_daily_file(
     Uses SQL query to pull data of stocks with share code 10 or 11, 
     from NYSE, AMEX, and Nasdaq.
     """
+    import wrds
+
     # pull one extra month of data for cleaning the data
     start_date = datetime.strptime(start_date, "%Y-%m-%d")
     start_date = start_date - relativedelta(months=1)
@@ -51,28 +53,41 @@ def pull_CRSP_daily_file(
         msenames.shrcd IN (10, 11) AND
         msenames.exchcd BETWEEN 1 AND 3
     """
-    # with wrds.Connection(wrds_username=wrds_username) as db:
-    #     df = db.raw_sql(
-    #         query, date_cols=["date", "namedt", "nameendt", "dlstdt"]
-    #     )
-    db = wrds.Connection(wrds_username=wrds_username)
-    df = db.raw_sql(
-        query, date_cols=["date"]
-    )
-    db.close()
-
-    df = df.loc[:, ~df.columns.duplicated()]
+    # the context manager connects on entry, so don't also connect in the constructor;
+    # the connection is closed even if the query fails
+    with wrds.Connection(wrds_username=wrds_username, autoconnect=False) as db:
+        df = db.raw_sql(
+            query, date_cols=["date"]
+        )
+
     df["shrout"] = df["shrout"] * 1000
+    # the identifiers come back as float64; they are never missing after the join
+    df = df.astype({"permno": "int32", "permco": "int32", "exchcd": "int8"})
 
     return df
 
 
-def load_CRSP_daily_file(data_dir=DATA_DIR):
+def load_CRSP_daily_file(data_dir=DATA_DIR, columns=None, cache=False):
     """
     Load daily CRSP stock data
+
+    Args:
+        - columns: columns to read, all columns if None
+        - cache: if True, read from an uncompressed Feather copy of the file
+          (data/cache/CRSP_stock.feather), which skips the parquet
+          decompression. The copy is rewritten from the parquet file when
+          it is missing or older than it.
     """
     path = Path(data_dir) / "pulled" / "CRSP_stock.parquet"
-    crsp = pd.read_parquet(path)
+    cache_path = Path(data_dir) / "cache" / "CRSP_stock.feather"
+    if cache:
+        if cache_path.exists() and cache_path.stat().st_mtime >= path.stat().st_mtime:
+            return pd.read_feather(cache_path, columns=columns)
+        crsp = pd.read_parquet(path)
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        crsp.to_feather(cache_path, compression="uncompressed")
+        return crsp if columns is None else crsp[columns]
+    crsp = pd.read_parquet(path, columns=columns)
     return crsp
 
 
@@ -83,17 +98,16 @@ def pull_CRSP_index_files(
     """
     Pulls CRSP index files from a specified start date to end date.
     """
+    import wrds
+
     # Pull index files
     query = f"""
         SELECT * 
         FROM crsp.dsix
         WHERE caldt BETWEEN '{start_date}' AND '{end_date}'
     """
-    # with wrds.Connection(wrds_username=wrds_username) as db:
-    #     df = db.raw_sql(query, date_cols=["month", "caldt"])
-    db = wrds.Connection(wrds_username=wrds_username)
-    df = db.raw_sql(query, date_cols=["caldt"])
-    db.close()
+    with wrds.Connection(wrds_username=wrds_username, autoconnect=False) as db:
+        df = db.raw_sql(query, date_cols=["caldt"])
     return df
 
 
@@ -102,19 +116,41 @@ def load_CRSP_index_files(data_dir=DATA_DIR):
     Load CRSP index files
     """
     path = Path(data_dir) / "pulled" / f"CRSP_DSIX.parquet"
-    df = pd.read_parquet(path)
+    df = read_parquet_cached(path)
     return df
 
 
+@lru_cache(maxsize=16)
+def _read_parquet_cached(path, mtime_ns):
+    return pd.read_parquet(path)
+
+
+def read_parquet_cached(path):
+    """
+    Read a parquet file, reusing the result of earlier reads of the same file
+    as long as it hasn't been modified since. Returns a copy, so the caller
+    can modify it without affecting later reads.
+    """
+    path = Path(path)
+    return _read_parquet_cached(path, path.stat().st_mtime_ns).copy()
+
+
 def demo():
     df_dsf = load_CRSP_daily_file(data_dir=DATA_DIR)
     df_msix = load_CRSP_index_files(data_dir=DATA_DIR)
 
 
-if __name__ == "__main__":
+def main():
+    """
+    Pull CRSP daily stock data and index files and save them to disk
+    """
     df_dsf = pull_CRSP_daily_file(wrds_username=WRDS_USERNAME)
     df_dsf.to_parquet(DATA_DIR / "pulled" / "CRSP_stock.parquet")
 
     df_msix = pull_CRSP_index_files(start_date=START_DATE, end_date=END_DATE)
     path = Path(DATA_DIR) / "pulled" / f"CRSP_DSIX.parquet"
-    df_msix.to_parquet(path)
\ No newline at end of file
+    df_msix.to_parquet(path)
+
+
+if __name__ == "__main__":
+    main()
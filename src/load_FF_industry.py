@@ -5,7 +5,6 @@ The data is needed to construct the industry portfolios used in Reversal strateg
 """
 
 import pandas as pd
-import pandas_datareader
 import config
 from pathlib import Path
 
@@ -20,6 +19,7 @@ def pull_FF_industry_portfolio_daily(start=START_DATE, end=END_DATE):
     Pull 48 industry portfolio daily returns
     from the Fama/French Data Library from a specified start date to end date.
     """
+    import pandas_datareader
 
     df = pandas_datareader.data.DataReader("48_Industry_Portfolios_daily", "famafrench", start=start, end=end)
     return df
@@ -43,7 +43,14 @@ def demo():
     ff = load_FF_industry_portfolio_daily(data_dir=DATA_DIR)
 
 
-if __name__ == "__main__":
+def main():
+    """
+    Pull 48 industry portfolio daily returns and save them to disk
+    """
     ff = pull_FF_industry_portfolio_daily()
     ff[0].to_parquet(DATA_DIR / "pulled" / "FF_portfolios_value_weighted.parquet")
     ff[1].to_parquet(DATA_DIR / "pulled" / "FF_portfolios_equal_weighted.parquet")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,7 +6,6 @@ This module is used to load VIX data from FRED and save it to local file.
 '''
 
 import pandas as pd
-import pandas_datareader
 import config
 from pathlib import Path
 
@@ -19,6 +18,8 @@ def pull_vix_from_fred(start=START_DATE, end=END_DATE):
     """
     pull VIX data from FRED
     """
+    import pandas_datareader
+
     df = pandas_datareader.get_data_fred("VIXCLS", start=start, end=end)
     return df
 
@@ -32,6 +33,13 @@ def load_vix(data_dir=DATA_DIR):
 
 
 
-if __name__ == "__main__":
+def main():
+    """
+    Pull VIX data from FRED and save it to disk
+    """
     df = pull_vix_from_fred()
     df.to_parquet(DATA_DIR / "pulled" / "vix.parquet")
+
+
+if __name__ == "__main__":
+    main()
@@ -12,6 +12,7 @@ WRDS_USERNAME = config.WRDS_USERNAME
 import misc_tools
 import load_CRSP_stock
 import load_FF_industry
+import regression_hac
 
 """
 VIX
@@ -52,7 +53,7 @@ def build_rm_factor(df):
     """
     df_dsix = load_CRSP_stock.load_CRSP_index_files(data_dir=DATA_DIR)
     df_dsix["vwretd"] = df_dsix["vwretd"].shift(5)
-    df_dsix['RM'] = (1 + df_dsix['vwretd']).rolling(20).apply(np.prod, raw=True) - 1
+    df_dsix['RM'] = regression_hac.rolling_prod(1 + df_dsix[['vwretd']], 20)['vwretd'] - 1
     df = pd.merge(df, df_dsix[["RM"]], left_index=True, right_on='caldt')
     return df
     
@@ -82,14 +83,14 @@ def daily_return_regression(str_return, vix, use_dummy = False, use_rm = False):
     if use_rm:
         df = build_rm_factor(df)
 
-    # regression
-    X = df[["VIX"]]
+    # regression: select all regressors at once rather than adding columns to a slice of df
+    x_cols = ["VIX"]
     if use_dummy:
-        X["dummy"] = df["dummy"]
+        x_cols.append("dummy")
     if use_rm:
-        X["RM"] = df["RM"]
+        x_cols.append("RM")
 
-    X = sm.add_constant(X)
+    X = sm.add_constant(df[x_cols])
     y = df[str_return.columns[0]]
     model = sm.OLS(y, X).fit()
     return model.params, model.bse, model.rsquared
@@ -113,7 +114,8 @@ def monthly_return_regression(str_return, vix):
 
     # group by year-month, and take the last 5th day values of the month, shift by 1 to be the predictor of the next month
     df = df.reset_index(names=['date'])
-    df = df.groupby(df['date'].dt.to_period('M')).apply(lambda x: x.iloc[-5])
+    df = df.groupby(df['date'].dt.to_period('M')).nth(-5)
+    df.index = df['date'].dt.to_period('M')
     df = df.shift(1)
 
     # regression
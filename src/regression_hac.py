@@ -20,28 +20,59 @@ import load_CRSP_stock
 import calc_reversal_strategy
 
 
-def prepare_data(ret, vix, rm, lag=5, to_monthly=False):
+def rolling_prod(df, window):
     """
-    Align data for regression
+    Product over a rolling window of the rows of a DataFrame, NaN until the window is full
 
-    VIX - divided by sqrt(250), lagged by 5 days
-    RM - 4-week return, lagged by 5 days
-    g - dummies 1 before 2001/04/09 and 0 after, lagged by 5 days
+    The same values as df.rolling(window).apply(np.prod, raw=True), but all
+    windows are multiplied at once through a strided view instead of one
+    Python call per window
+    """
+    values = df.to_numpy(dtype=float)
+    prod = np.full(values.shape, np.nan)
+    if len(values) >= window:
+        prod[window - 1:] = np.lib.stride_tricks.sliding_window_view(values, window, axis=0).prod(axis=-1)
+    return pd.DataFrame(prod, index=df.index, columns=df.columns)
+
+
+def prepare_predictors(vix, rm):
+    """
+    Build the predictors before they are lagged
+
+    VIX - divided by sqrt(250)
+    RM - 4-week return
+    g - dummies 1 before 2001/04/09 and 0 after
     """
-    ret.dropna(inplace=True)
     vix.dropna(inplace=True)
     rm.dropna(inplace=True)
 
-    ret.index.name = 'date'
     vix.index.name = 'date'
     rm.index.name = 'date'
 
     vix = vix / np.sqrt(250)
 
-    rm = (1 + rm).rolling(20).apply(np.prod, raw=True) - 1
+    rm = rolling_prod(1 + rm, 20) - 1
+
+    g = pd.Series((rm.index <= '2001-04-09').astype(np.int8), index=rm.index, name='Pre-decim.')
+    return vix, rm, g
 
-    g = (rm.index.to_series() <= '2001-04-09').astype(int)
-    g.name = 'Pre-decim.'
+
+def prepare_data(ret, vix, rm, lag=5, to_monthly=False, predictors=None):
+    """
+    Align data for regression
+
+    VIX - divided by sqrt(250), lagged by 5 days
+    RM - 4-week return, lagged by 5 days
+    g - dummies 1 before 2001/04/09 and 0 after, lagged by 5 days
+
+    - predictors: output of prepare_predictors(vix, rm), built here when not given
+    """
+    ret.dropna(inplace=True)
+    ret.index.name = 'date'
+
+    if predictors is None:
+        predictors = prepare_predictors(vix, rm)
+    vix, rm, g = predictors
 
     if to_monthly:
         ret, vix, rm, g = daily_to_monthly(ret, vix, rm, g, lag)
@@ -166,7 +197,10 @@ def generate_table(data, data_m, reproduce=False):
 
 
 
-if __name__ == "__main__":
+def main():
+    """
+    Run the HAC regressions and generate Table 2 for replication and reproduction
+    """
     # 2010
     reversal_ret = calc_reversal_strategy.load_reversal_return()
     reversal_ret.columns = ['trade', 'quote', 'industry']
@@ -176,8 +210,11 @@ if __name__ == "__main__":
     rm = rm.set_index('caldt')[['vwretx']]
     rm.columns = ['$R_M$']
     
-    data = prepare_data(reversal_ret, vix, rm)
-    data_m = prepare_data(reversal_ret, vix, rm, to_monthly=True)
+    # the predictors are the same for both samples, so build them once
+    predictors = prepare_predictors(vix, rm)
+
+    data = prepare_data(reversal_ret, vix, rm, predictors=predictors)
+    data_m = prepare_data(reversal_ret, vix, rm, to_monthly=True, predictors=predictors)
 
     table = generate_table(data, data_m)
 
@@ -185,7 +222,11 @@ if __name__ == "__main__":
     reversal_ret = calc_reversal_strategy.load_reversal_return(reproduce=True)
     reversal_ret.columns = ['trade', 'quote', 'industry']
     
-    data = prepare_data(reversal_ret, vix, rm)
-    data_m = prepare_data(reversal_ret, vix, rm, to_monthly=True)
+    data = prepare_data(reversal_ret, vix, rm, predictors=predictors)
+    data_m = prepare_data(reversal_ret, vix, rm, to_monthly=True, predictors=predictors)
 
-    table = generate_table(data, data_m, reproduce=True)
\ No newline at end of file
+    table = generate_table(data, data_m, reproduce=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,8 @@ The module includes unit tests to ensure that numbers in replicated Table 1 matc
 
 import pandas as pd
 import numpy as np
+import pytest
+import statsmodels.api as sm
 import config
 import calc_reversal_strategy
 from pandas.testing import assert_frame_equal
@@ -160,6 +162,23 @@ def test_worst_3_month_return():
     assert np.allclose(worst_3_month_return_raw, expected_worst_3_month_return_raw, rtol=0.4)
     assert np.allclose(worst_3_month_return_hedge, expected_worst_3_month_return_hedge, rtol=0.7)
 
+"""
+Test that the hedging regression refuses factor and return series on different dates
+"""
+def test_multiple_beta_alignment():
+    dates = pd.bdate_range('2000-01-03', periods=30)
+    rng = np.random.default_rng(0)
+    index = pd.Series(rng.normal(size=30), index=dates)
+    factor = pd.concat([index, index * np.sign(index.shift(1))], axis=1)
+    ret = pd.Series(rng.normal(size=30), index=dates)
+
+    beta = calc_reversal_strategy.calc_multiple_beta(factor, ret)
+    expected_beta = sm.OLS(ret, sm.add_constant(factor), missing='drop').fit().params[1:]
+    assert np.allclose(beta, expected_beta)
+
+    with pytest.raises(ValueError):
+        calc_reversal_strategy.calc_multiple_beta(factor, ret.shift(1, freq='B'))
+
 
 
 # if __name__ == '__main__':
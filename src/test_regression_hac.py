@@ -12,16 +12,39 @@ Following tests are included:
 
 import pandas as pd
 import numpy as np
+import pytest
 import config
 
 DATA_DIR = config.DATA_DIR
 
 
-def test_table_formatting():
+@pytest.fixture(scope='module')
+def table():
+    """
+    Load Table 2 once and share it across the tests in this module
+    """
+    return pd.read_parquet(DATA_DIR / 'derived' / 'Table_2.parquet')
+
+
+def _numeric_row(row):
+    """
+    Convert a row of formatted table cells to floats, dropping the blank cells
+    """
+    values = row.values
+    return values[values != ''].astype('float')
+
+
+def _se_row(row):
+    """
+    Convert a row of standard errors in parentheses to floats, dropping the blank cells
+    """
+    return _numeric_row(row.str.strip('()'))
+
+
+def test_table_formatting(table):
     """
     Test whether the table is formatted correctly
     """
-    data = pd.read_parquet(DATA_DIR / 'derived' / 'Table_2.parquet')
 
     expected_index = ['Intercept', '', 'VIX', '', 'Pre-decim.', '', '$R_M$', '', 'Adj. $R^2$']
     expected_columns = [
@@ -39,39 +62,32 @@ def test_table_formatting():
         ('\\makecell{Industry\\\\portfolios}', 'Monthly', '(12)'),
     ]
 
-    assert data.shape == (9, 12)
-    assert data.index.tolist() == expected_index
-    assert data.columns.tolist() == expected_columns
+    assert table.shape == (9, 12)
+    assert table.index.tolist() == expected_index
+    assert table.columns.tolist() == expected_columns
 
 
-def test_coef_sign():
+def test_coef_sign(table):
     """
     Test whether the coefficients have the expected sign within 1 standard error
 
     For intercept, no test is performed.
     Ambiguous signs are marked with 1 or -1. Otherwise, the expected sign is marked with 2.
     """
-    data = pd.read_parquet(DATA_DIR / 'derived' / 'Table_2.parquet')
     expected_vix_sign = np.ones(12) * 2
     expected_g_sign = np.array([2, 2, 2, 2, 2, 2, 1, 1, 1])
     expected_rm_sign = np.array([-2, -1, -2, -1, -2, -1])
 
-    vix_coefs = data.loc['VIX'].values
-    vix_coefs = vix_coefs[vix_coefs != ''].astype('float')
-    vix_se = data.iloc[3].str.replace('(', '').str.replace(')', '').values
-    vix_se = vix_se[vix_se != ''].astype('float')
+    vix_coefs = _numeric_row(table.loc['VIX'])
+    vix_se = _se_row(table.iloc[3])
     vix_sign = np.sign(vix_coefs + vix_se) + np.sign(vix_coefs - vix_se)
 
-    g_coefs = data.loc['Pre-decim.'].values
-    g_coefs = g_coefs[g_coefs != ''].astype('float')
-    g_se = data.iloc[5].str.replace('(', '').str.replace(')', '').values
-    g_se = g_se[g_se != ''].astype('float')
+    g_coefs = _numeric_row(table.loc['Pre-decim.'])
+    g_se = _se_row(table.iloc[5])
     g_sign = np.sign(g_coefs + g_se) + np.sign(g_coefs - g_se)
 
-    rm_coefs = data.loc['$R_M$'].values
-    rm_coefs = rm_coefs[rm_coefs != ''].astype('float')
-    rm_se = data.iloc[7].str.replace('(', '').str.replace(')', '').values
-    rm_se = rm_se[rm_se != ''].astype('float')
+    rm_coefs = _numeric_row(table.loc['$R_M$'])
+    rm_se = _se_row(table.iloc[7])
     rm_sign = np.sign(rm_coefs + rm_se) + np.sign(rm_coefs - rm_se)
 
     test1 = np.abs(expected_vix_sign - vix_sign) <= 1
@@ -85,7 +101,7 @@ def test_coef_sign():
 
 
 
-def test_coef_r2():
+def test_coef_r2(table):
     """
     Test whether the results match the expected results within a certain tolerance
 
@@ -101,7 +117,6 @@ def test_coef_r2():
     #                          0.03, 0.03, 0.03, 0.02,
     #                          0.02, 0.02, 0.02, 0.01])
 
-    data = pd.read_parquet(DATA_DIR / 'derived' / 'Table_2.parquet')
     multiplier = 3
     
     expected_vix_coefs = np.array([0.22, 0.20, 0.18, 0.15, 
@@ -126,17 +141,10 @@ def test_coef_r2():
                                 0.01, 0.01, 0.01, 0.07])
     adj_r2_tolerance = 0.01
 
-    vix_coefs = data.loc['VIX'].values
-    vix_coefs = vix_coefs[vix_coefs != ''].astype('float')
-
-    g_coefs = data.loc['Pre-decim.'].values
-    g_coefs = g_coefs[g_coefs != ''].astype('float')
-
-    rm_coefs = data.loc['$R_M$'].values
-    rm_coefs = rm_coefs[rm_coefs != ''].astype('float')
-
-    adj_r2 = data.loc['Adj. $R^2$'].values
-    adj_r2 = adj_r2[adj_r2 != ''].astype('float')
+    vix_coefs = _numeric_row(table.loc['VIX'])
+    g_coefs = _numeric_row(table.loc['Pre-decim.'])
+    rm_coefs = _numeric_row(table.loc['$R_M$'])
+    adj_r2 = _numeric_row(table.loc['Adj. $R^2$'])
     
     test1 = np.abs(expected_vix_coefs - vix_coefs) <= (vix_se * multiplier)
     test2 = np.abs(expected_g_coefs - g_coefs) <= (g_se * multiplier)